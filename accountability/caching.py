@@ -12,54 +12,148 @@ Usage:
         return api.get_price(symbol)
 """
 
-import json
+import asyncio
+import atexit
+import itertools
+import pickle
 import sqlite3
+import threading
 import time
 import functools
 import hashlib
-from typing import Any, Callable
+import inspect
+import io
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable
 import logging
-from datetime import datetime
+
+import orjson
+import zstandard as zstd
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Per-thread SQLite connections, keyed by database path. sqlite3 connections
+# can't be shared across threads, but each thread reuses its own for the
+# lifetime of the process instead of reconnecting on every cached call.
+_local = threading.local()
+
+# Applied once when a connection is opened. WAL lets readers proceed while a
+# writer holds the lock, and NORMAL sync is safe under WAL.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -20000",
+    # Let SQLite's C-level busy handler back off and retry on a locked
+    # database instead of failing straight away.
+    "PRAGMA busy_timeout = 10000",
+)
+
+# Bump whenever the on-disk format of cached rows changes. Cache tables
+# written by an older version are dropped the first time a process connects.
+CACHE_SCHEMA_VERSION = 5
+
+
+def _drop_stale_tables(conn: sqlite3.Connection) -> None:
+    """Drop every table if the database was written with another schema version."""
+    (version,) = conn.execute("PRAGMA user_version").fetchone()
+    if version == CACHE_SCHEMA_VERSION:
+        return
+    tables = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    for (name,) in tables.fetchall():
+        conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+    conn.execute(f"PRAGMA user_version = {CACHE_SCHEMA_VERSION}")
+    conn.commit()
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Open a new connection to db_path and apply CONNECTION_PRAGMAS."""
+    conn = sqlite3.connect(db_path, timeout=20.0)
+    try:
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        _drop_stale_tables(conn)
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """Return this thread's connection to db_path, opening it on first use."""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = _connect(db_path)
+    return conn
+
+
 class RetryableDatabase:
-    """Database connection with retry logic for handling concurrent access."""
+    """
+    Database connection for handling concurrent access.
 
-    MAX_RETRIES = 5
-    RETRY_DELAY = 0.1  # seconds
+    Lock contention is retried inside SQLite itself via PRAGMA busy_timeout,
+    so callers don't need their own retry loops.
+    """
 
     def __init__(self, db_path: str):
         self.db_path = db_path
         self.conn = None
 
     def __enter__(self):
-        for attempt in range(self.MAX_RETRIES):
-            try:
-                self.conn = sqlite3.connect(self.db_path, timeout=20.0)
-                self.conn.execute("PRAGMA busy_timeout = 10000")
-                return self.conn
-            except sqlite3.OperationalError as e:
-                if attempt == self.MAX_RETRIES - 1:
-                    logger.error(
-                        "Failed to connect to database after %d attempts: %s",
-                        self.MAX_RETRIES,
-                        e,
-                    )
-                    raise
-                logger.warning(
-                    "Database connection attempt %d failed, retrying...",
-                    attempt + 1,
-                )
-                time.sleep(self.RETRY_DELAY * (2**attempt))
+        self.conn = get_connection(self.db_path)
         return self.conn
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.conn:
-            self.conn.close()
+        # The connection is owned by the thread-local pool and stays open for
+        # the rest of the process.
+        self.conn = None
+
+
+# Pickled values larger than this are zstd-compressed before being stored.
+# Stored pickles start with a one-byte tag saying which form follows. Portable
+# (JSON) values are stored as plain orjson output, untagged and uncompressed.
+COMPRESS_THRESHOLD = 1024  # bytes
+_COMPRESSED = b"Z"
+_RAW = b"R"
+
+
+def _zstd() -> tuple[zstd.ZstdCompressor, zstd.ZstdDecompressor]:
+    """Return this thread's zstd (de)compressor, which can't be shared."""
+    codec = getattr(_local, "zstd", None)
+    if codec is None:
+        codec = _local.zstd = (zstd.ZstdCompressor(level=3), zstd.ZstdDecompressor())
+    return codec
+
+
+# orjson options for portable caches: naive datetimes are taken to be UTC and
+# NumPy arrays are written as JSON arrays.
+_ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _serialize(value: Any, portable: bool = False) -> bytes:
+    if portable:
+        return orjson.dumps(value, option=_ORJSON_OPTIONS)
+    payload = pickle.dumps(value, protocol=5)
+    if len(payload) > COMPRESS_THRESHOLD:
+        return _COMPRESSED + _zstd()[0].compress(payload)
+    return _RAW + payload
+
+
+def _deserialize(blob: bytes, portable: bool = False) -> Any:
+    if portable:
+        return orjson.loads(blob)
+    if blob[:1] == _COMPRESSED:
+        return pickle.loads(_zstd()[1].decompress(blob[1:]))
+    return pickle.loads(blob[1:])
 
 
 def get_table_name(func_name: str) -> str:
@@ -68,113 +162,364 @@ def get_table_name(func_name: str) -> str:
     return f"cache_{hashlib.md5(func_name.encode()).hexdigest()}"
 
 
+def get_db_path(table_name: str) -> str:
+    """
+    Generate the database file for a cache table.
+
+    Each table gets its own file (and WAL), so writers for different cached
+    functions never contend for the same lock.
+    """
+    return f"cache_{hashlib.md5(table_name.encode()).hexdigest()[:8]}.db"
+
+
+def _canonical(value: Any) -> Any:
+    """Rewrite value so equal containers compare and pickle identically."""
+    if isinstance(value, dict):
+        items = ((_canonical(k), _canonical(v)) for k, v in value.items())
+        return (dict, tuple(sorted(items, key=repr)))
+    if isinstance(value, (set, frozenset)):
+        return (frozenset, tuple(sorted(map(_canonical, value), key=repr)))
+    if type(value) in (list, tuple):
+        return type(value)(map(_canonical, value))
+    return value
+
+
+def make_cache_key(name: bytes, arguments: tuple) -> bytes:
+    """
+    Build a fixed-width cache key for a call to the function called name.
+
+    arguments holds the call's (parameter, value) pairs with defaults
+    applied, so positional, keyword and defaulted calls share a key. Dicts
+    and sets are sorted and pickled without a memo, so neither insertion
+    order nor object identity affects the key. Arguments that cannot be
+    pickled (lambdas, locks, ...) are keyed by their repr instead.
+    """
+    call = _canonical(arguments)
+    key = hashlib.blake2b(name, digest_size=16)
+    buffer = io.BytesIO()
+    pickler = pickle.Pickler(buffer, protocol=5)
+    pickler.fast = True
+    try:
+        pickler.dump(call)
+    except (pickle.PicklingError, TypeError, AttributeError, ValueError):
+        key.update(repr(call).encode())
+    else:
+        key.update(buffer.getbuffer())
+    return key.digest()
+
+
 def create_cache_table(conn: sqlite3.Connection, table_name: str) -> None:
     """Create a cache table for a specific function if it doesn't exist."""
     cur = conn.cursor()
     cur.execute(
         f"""
         CREATE TABLE IF NOT EXISTS {table_name} (
-            args_hash TEXT PRIMARY KEY,
-            args_pickle BLOB,
-            result_pickle BLOB,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            timeout_at TIMESTAMP,
-            last_accessed TIMESTAMP
+            key BLOB PRIMARY KEY,
+            value BLOB,
+            timestamp FLOAT,
+            last_accessed FLOAT
         )
     """
     )
     conn.commit()
 
 
-def _serialize_for_cache(obj: Any) -> Any:
-    """Helper function to serialize objects for caching."""
-    if isinstance(obj, datetime):
-        return {"__datetime__": obj.isoformat()}
-    return obj
+# Cache writes waiting to be committed, as (db_path, sql, params). They are
+# flushed together once MAX_PENDING_WRITES accumulate or the oldest has waited
+# MAX_PENDING_AGE seconds, so one commit covers many rows. Only a full batch
+# is committed on the caller's thread; the age limit is enforced by a daemon
+# thread, even if no further cached call comes along.
+MAX_PENDING_WRITES = 32
+MAX_PENDING_AGE = 0.05  # seconds
+
+_pending: list[tuple[str, str, tuple]] = []
+_pending_since = 0.0
+_flush_lock = threading.Lock()
+
+# Set when a new batch starts; wakes the flusher thread
+_batch_started = threading.Event()
+_flusher: threading.Thread | None = None
 
+# Event loop and queue of the running background_writer, if any
+_writer: tuple[asyncio.AbstractEventLoop, asyncio.Queue] | None = None
 
-def _deserialize_from_cache(obj: Any) -> Any:
-    """Helper function to deserialize objects from cache."""
-    if isinstance(obj, dict) and "__datetime__" in obj:
-        return datetime.fromisoformat(obj["__datetime__"])
-    return obj
 
+def _write_batch(batch: list[tuple[str, str, tuple]]) -> None:
+    """Commit a batch of writes in one transaction per database."""
+    by_db: dict[str, list[tuple[str, str, tuple]]] = {}
+    for write in batch:
+        by_db.setdefault(write[0], []).append(write)
 
-def cache_result(table_name: str, ttl_seconds: int = 3600):
+    for db_path, writes in by_db.items():
+        with RetryableDatabase(db_path) as conn, conn:
+            for sql, group in itertools.groupby(writes, key=lambda w: w[1]):
+                conn.executemany(sql, [params for _, _, params in group])
+
+
+def flush_writes() -> None:
+    """Commit all pending cache writes."""
+    with _flush_lock:
+        batch = _pending[:]
+        _pending.clear()
+    if not batch:
+        return
+    try:
+        _write_batch(batch)
+    except sqlite3.Error as e:
+        logger.error("Cache write error: %s", e)
+
+
+def _flush_forever() -> None:
+    """Flush each batch once its oldest write is MAX_PENDING_AGE old."""
+    while True:
+        _batch_started.wait()
+        _batch_started.clear()
+        delay = _pending_since + MAX_PENDING_AGE - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        flush_writes()
+
+
+def _queue_write(db_path: str, sql: str, params: tuple) -> None:
     """
-    Decorator that caches function results in SQLite with retry logic.
+    Hand a write to the background writer if one is running, otherwise add
+    it to the pending batch and flush that if it is full.
+    """
+    global _pending_since, _flusher
+    writer = _writer
+    if writer is not None:
+        loop, queue = writer
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (db_path, sql, params))
+            return
+        except RuntimeError:
+            # The writer's loop has already closed
+            pass
+
+    with _flush_lock:
+        if not _pending:
+            _pending_since = time.monotonic()
+            if _flusher is None:
+                _flusher = threading.Thread(
+                    target=_flush_forever, name="cache-flusher", daemon=True
+                )
+                _flusher.start()
+            _batch_started.set()
+        _pending.append((db_path, sql, params))
+        full = len(_pending) >= MAX_PENDING_WRITES
+    if full:
+        flush_writes()
+
+
+atexit.register(flush_writes)
+
+
+def _drain(queue: asyncio.Queue) -> list:
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+@asynccontextmanager
+async def background_writer() -> AsyncIterator[None]:
+    """
+    Commit cache writes from a background task while the context is open.
+
+    Cached functions called meanwhile queue their writes and return straight
+    away; the task commits everything queued so far as one batch on a single
+    writer thread. Writes still queued on exit are committed before it
+    returns.
+    """
+    global _writer
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-writer")
+
+    async def write_forever() -> None:
+        while True:
+            batch = [await queue.get()]
+            batch.extend(_drain(queue))
+            try:
+                await loop.run_in_executor(executor, _write_batch, batch)
+            except sqlite3.Error as e:
+                logger.error("Cache write error: %s", e)
+
+    flush_writes()
+    _writer = (loop, queue)
+    task = asyncio.create_task(write_forever())
+    try:
+        yield
+    finally:
+        _writer = None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # Let writes scheduled from other threads land before the final drain
+        await asyncio.sleep(0)
+        remaining = _drain(queue)
+        try:
+            if remaining:
+                await loop.run_in_executor(executor, _write_batch, remaining)
+        except sqlite3.Error as e:
+            logger.error("Cache write error: %s", e)
+        finally:
+            executor.shutdown(wait=True)
+
+
+# Each cache table is checked for expired and excess rows once every
+# EVICT_INTERVAL inserts
+EVICT_INTERVAL = 64
+
+# Hits served from memory refresh last_accessed in SQLite at most this often
+# per key, so eviction still sees hot keys without a write per hit
+TOUCH_INTERVAL = 1.0  # seconds
+
+
+def cache_result(
+    table_name: str,
+    ttl_seconds: int = 3600,
+    maxsize: int = 128,
+    max_entries: int = 1024,
+    portable: bool = False,
+):
+    """
+    Decorator that caches function results in SQLite.
+
+    Recent results are also kept in an in-process LRU so repeated calls skip
+    SQLite entirely. Those hits return the cached object itself rather than
+    a fresh copy, so callers must not mutate what they get back. Writes to
+    SQLite are batched and committed within MAX_PENDING_AGE seconds (or
+    handed to background_writer() while it runs); call flush_writes() to
+    commit a pending batch immediately.
+
+    Every EVICT_INTERVAL inserts, expired rows are deleted and, if the table
+    holds more than max_entries rows, the least recently accessed are
+    deleted to bring it back to 90% of max_entries.
+
+    Values are pickled (and zstd-compressed when large) by default. With
+    portable=True each row's value column holds plain, uncompressed JSON
+    (via orjson) that other tools can read directly, at the cost of
+    round-tripping: datetimes come back as ISO strings and tuples as lists.
+    Every call returns the round-tripped value, including the one that
+    computed it, so the result does not depend on which cache layer answered.
+    Use a new table_name when switching an existing cache between the two.
 
     Args:
         table_name: Name of the table to store cache results
         ttl_seconds: Time to live for cached results in seconds
+        maxsize: Number of results to keep in the in-process LRU
+        max_entries: Number of results to keep in the SQLite table
+        portable: Store values as JSON instead of pickle
     """
 
     def decorator(func: Callable) -> Callable:
+        name = func.__qualname__.encode()
+        signature = inspect.signature(func)
+        db_path = get_db_path(table_name)
+        # Expired rows are filtered out by SQLite. The timestamp is still read
+        # so the in-process LRU expires the value at the same time.
+        select_sql = f"""
+            SELECT value, timestamp FROM {table_name}
+            WHERE key = ? AND timestamp > ?
+        """
+        upsert_sql = f"""
+            INSERT INTO {table_name} (key, value, timestamp, last_accessed)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                value = excluded.value,
+                timestamp = excluded.timestamp,
+                last_accessed = excluded.last_accessed
+        """
+        touch_sql = f"UPDATE {table_name} SET last_accessed = ? WHERE key = ?"
+        expire_sql = f"DELETE FROM {table_name} WHERE timestamp < ?"
+        evict_sql = f"""
+            DELETE FROM {table_name}
+            WHERE (SELECT COUNT(*) FROM {table_name}) > ? AND key IN (
+                SELECT key FROM {table_name} ORDER BY last_accessed
+                LIMIT (SELECT COUNT(*) FROM {table_name}) - ?
+            )
+        """
+        inserts = itertools.count(1)
+
+        # Create the table once up front rather than on every call
+        try:
+            with RetryableDatabase(db_path) as conn:
+                create_cache_table(conn, table_name)
+        except sqlite3.Error as e:
+            logger.error("Failed to create cache table %s: %s", table_name, e)
+
+        # cache_key -> (value, timestamp, last touched), most recently used last
+        memory: OrderedDict[bytes, tuple[Any, float, float]] = OrderedDict()
+        memory_lock = threading.Lock()
+
+        def remember(
+            cache_key: bytes, value: Any, timestamp: float, touched: float
+        ) -> None:
+            with memory_lock:
+                memory[cache_key] = (value, timestamp, touched)
+                memory.move_to_end(cache_key)
+                if len(memory) > maxsize:
+                    memory.popitem(last=False)
+
+        def maybe_evict(current_time: float) -> None:
+            if next(inserts) % EVICT_INTERVAL:
+                return
+            _queue_write(db_path, expire_sql, (current_time - ttl_seconds,))
+            _queue_write(db_path, evict_sql, (max_entries, max_entries * 9 // 10))
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            cache_key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            cache_key = make_cache_key(name, tuple(bound.arguments.items()))
+            current_time = time.time()
 
-            try:
-                with RetryableDatabase("cache.db") as conn:
-                    conn.execute(
-                        f"""
-                        CREATE TABLE IF NOT EXISTS {table_name} (
-                            key TEXT PRIMARY KEY,
-                            value TEXT,
-                            timestamp FLOAT
-                        )
-                    """
-                    )
-
-                    cursor = conn.execute(
-                        f"SELECT value, timestamp FROM {table_name} WHERE key = ?",
-                        (cache_key,),
-                    )
-                    result = cursor.fetchone()
-
-                    current_time = time.time()
-                    if result and (current_time - result[1]) < ttl_seconds:
-                        return json.loads(
-                            result[0], object_hook=_deserialize_from_cache
-                        )
-
-                    # If no valid cache, compute new value
-                    new_value = func(*args, **kwargs)
-
-                    # Store in cache with retry logic
-                    for attempt in range(RetryableDatabase.MAX_RETRIES):
-                        try:
-                            serialized_value = json.dumps(
-                                new_value, default=_serialize_for_cache
-                            )
-                            conn.execute(
-                                f"""
-                                INSERT OR REPLACE INTO {table_name}
-                                (key, value, timestamp) VALUES (?, ?, ?)
-                                """,
-                                (cache_key, serialized_value, current_time),
-                            )
-                            conn.commit()
-                            break
-                        except sqlite3.OperationalError as e:
-                            if attempt == RetryableDatabase.MAX_RETRIES - 1:
-                                logger.error(
-                                    "Failed to write to cache after %d attempts: %s",
-                                    RetryableDatabase.MAX_RETRIES,
-                                    e,
-                                )
-                                raise
-                            logger.warning(
-                                "Cache write attempt %d failed, retrying...",
-                                attempt + 1,
-                            )
-                            time.sleep(RetryableDatabase.RETRY_DELAY * (2**attempt))
-
-                    return new_value
+            with memory_lock:
+                hit = memory.get(cache_key)
+                if hit and (current_time - hit[1]) < ttl_seconds:
+                    memory.move_to_end(cache_key)
+                    touch = current_time - hit[2] >= TOUCH_INTERVAL
+                    if touch:
+                        memory[cache_key] = (hit[0], hit[1], current_time)
+                else:
+                    hit = None
+            if hit:
+                if touch:
+                    _queue_write(db_path, touch_sql, (current_time, cache_key))
+                return hit[0]
 
+            try:
+                with RetryableDatabase(db_path) as conn:
+                    result = conn.execute(
+                        select_sql, (cache_key, current_time - ttl_seconds)
+                    ).fetchone()
+                if result:
+                    value = _deserialize(result[0], portable)
+                    remember(cache_key, value, result[1], current_time)
+                    _queue_write(db_path, touch_sql, (current_time, cache_key))
+                    return value
             except sqlite3.Error as e:
-                logger.error("Cache error: %s", e)
-                return func(*args, **kwargs)
+                logger.error("Cache read error: %s", e)
+
+            # If no valid cache, compute new value
+            new_value = func(*args, **kwargs)
+            serialized_value = _serialize(new_value, portable)
+            if portable:
+                # Hand back what a later SQLite hit would return
+                new_value = _deserialize(serialized_value, portable)
+            remember(cache_key, new_value, current_time, current_time)
+
+            _queue_write(
+                db_path,
+                upsert_sql,
+                (cache_key, serialized_value, current_time, current_time),
+            )
+            maybe_evict(current_time)
+
+            return new_value
 
         return wrapper
 
@@ -0,0 +1,120 @@
+"""
+Date parsing, filtering and bucketing for the dashboard's charts.
+Pure NumPy helpers, kept apart from streamlit_app.py so they can be tested.
+"""
+
+from datetime import datetime, date
+
+import numpy as np
+
+# Below this many points, converting to NumPy costs more than it saves
+VECTORIZE_THRESHOLD = 1000
+
+# 1970-01-05 was a Monday, so whole days since then modulo 7 give the weekday
+MONDAY_EPOCH = np.datetime64("1970-01-05", "D")
+
+# Spacing between points for the intraday fidelities, in seconds so that
+# half a step is still exact
+INTRADAY_STEPS = {
+    "5minute": np.timedelta64(300, "s"),
+    "10minute": np.timedelta64(600, "s"),
+    "hour": np.timedelta64(3600, "s"),
+}
+
+
+def gap_rangebreaks(dates, step):
+    """Rangebreaks hiding every gap between points spaced more than step apart.
+
+    Taken from the data itself, so overnight, weekend and holiday closures
+    are removed whatever the market's UTC offset is that day.
+    """
+    # Each break runs from half a step after one point to half a step before
+    # the next, so both bars keep their full width
+    gaps = np.flatnonzero(np.diff(dates) > step)
+    starts = dates[gaps] + step / 2
+    lengths = (dates[gaps + 1] - dates[gaps] - step) // np.timedelta64(1, "ms")
+    return [
+        dict(values=[str(start)], dvalue=int(length))
+        for start, length in zip(starts, lengths)
+    ]
+
+
+def parse_iso_dates(raw):
+    """Parse ISO-8601 strings from the API into a datetime64 array."""
+    # Keep the wall-clock time and drop any "Z" or +/-hh:mm offset, like
+    # datetime.replace(tzinfo=None); only the time part can hold a sign
+    day, sep, clock = np.char.partition(np.char.rstrip(np.array(raw), "Z"), "T").T
+    clock = np.char.partition(np.char.partition(clock, "+")[:, 0], "-")[:, 0]
+    return np.char.add(np.char.add(day, sep), clock).astype("datetime64[us]")
+
+
+def filter_date_range_np(dates, values, start_date=None, end_date=None):
+    """Vectorized filter_date_range for long series, returning arrays."""
+    dates_np = np.asarray(dates, dtype="datetime64[us]")
+    values_np = np.asarray(values, dtype=np.float64)
+    days = dates_np.astype("datetime64[D]")
+
+    # Weekdays only (Monday = 0, Sunday = 6)
+    mask = (days - MONDAY_EPOCH).astype(np.int64) % 7 < 5
+    if start_date and end_date:
+        mask &= (days >= np.datetime64(start_date, "D")) & (
+            days <= np.datetime64(end_date, "D")
+        )
+    else:
+        mask &= days >= np.datetime64(f"{date.today().year}-01-01", "D")
+
+    return dates_np[mask], values_np[mask]
+
+
+def filter_date_range(dates, values, start_date=None, end_date=None):
+    """Filter data based on date range or YTD, excluding weekends."""
+    if len(dates) == 0 or len(values) == 0:
+        return [], []
+
+    if len(dates) >= VECTORIZE_THRESHOLD:
+        return filter_date_range_np(dates, values, start_date, end_date)
+    if isinstance(dates, np.ndarray):
+        dates = dates.tolist()  # datetime64 is already timezone-naive
+    else:
+        # Convert API dates to timezone-naive once for the comparisons below
+        dates = [d.replace(tzinfo=None) for d in dates]
+
+    def is_weekday(d):
+        """Return True if date is a weekday (Mon-Fri)"""
+        return d.weekday() < 5  # Monday = 0, Sunday = 6
+
+    if start_date and end_date:
+        # Convert dates to timezone-naive datetime for comparison
+        start_dt = datetime.combine(start_date, datetime.min.time())
+        end_dt = datetime.combine(end_date, datetime.max.time())
+
+        # Filter weekdays within the range
+        filtered_data = [
+            (d, v)
+            for d, v in zip(dates, values)
+            if start_dt <= d <= end_dt and is_weekday(d)
+        ]
+    else:
+        # Filter for YTD and weekdays
+        current_year = date.today().year
+        filtered_data = [
+            (d, v)
+            for d, v in zip(dates, values)
+            if d.year >= current_year and is_weekday(d)
+        ]
+
+    if not filtered_data:
+        return [], []
+
+    return [d for d, _ in filtered_data], [v for _, v in filtered_data]
+
+
+def bucket_by_week(dates, values):
+    """Group data by week and calculate the average for each week."""
+    days = np.asarray(dates, dtype="datetime64[D]")
+    # Weeks start on Monday; step each day back to its week's Monday
+    weeks = days - ((days - MONDAY_EPOCH).astype(np.int64) % 7)
+    # Only weeks that have data get a bucket
+    week_starts, bucket = np.unique(weeks, return_inverse=True)
+    sums = np.bincount(bucket, weights=np.asarray(values, dtype=np.float64))
+    return week_starts, sums / np.bincount(bucket)
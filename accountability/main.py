@@ -4,13 +4,14 @@ Provides endpoints for historical portfolio data and YTD performance.
 """
 
 import os
-from typing import Optional
+from typing import cast, get_args
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 import robin_stocks.robinhood as rh
 
+from accountability.caching import background_writer
 from accountability.rh_api import (
     get_historical_portfolio_percentage,
     get_running_ytd_percentage,
@@ -25,7 +26,10 @@ from accountability.rh_types import (
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize Robinhood login when the application starts."""
+    """
+    Initialize Robinhood login when the application starts, and commit cache
+    writes in the background while it runs.
+    """
     username = os.getenv("ROBINHOOD_USERNAME")
     password = os.getenv("ROBINHOOD_PASSWORD")
     if not password:
@@ -33,7 +37,8 @@ async def lifespan(app: FastAPI):
             status_code=500, detail="ROBINHOOD_PASSWORD environment variable not set"
         )
     rh.login(username, password)
-    yield
+    async with background_writer():
+        yield
 
 
 app = FastAPI(title="Robinhood Portfolio API", lifespan=lifespan)
@@ -48,15 +53,37 @@ app.add_middleware(
 )
 
 
+# Allowed query parameter values, checked by set membership rather than by
+# validating each request against the Literal types
+_FIDELITIES = frozenset(get_args(FidelityType))
+_SPANS = frozenset(get_args(SpanType))
+_BOUNDS = frozenset(get_args(BoundsType))
+
+
+def _check_param(name: str, value: str, allowed: frozenset[str]) -> None:
+    """Raise a 422 if value isn't one of the allowed values for name."""
+    if value not in allowed:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Invalid {name} {value!r}, expected one of {sorted(allowed)}",
+        )
+
+
 @app.get("/portfolio/historical/percentage", response_model=list[PercentageDate])
 async def get_portfolio_history_percentage(
-    fidelity: Optional[FidelityType] = "day",
-    span: Optional[SpanType] = "week",
-    bounds: Optional[BoundsType] = "regular",
+    fidelity: str = Query("day", json_schema_extra={"enum": sorted(_FIDELITIES)}),
+    span: str = Query("week", json_schema_extra={"enum": sorted(_SPANS)}),
+    bounds: str = Query("regular", json_schema_extra={"enum": sorted(_BOUNDS)}),
 ) -> list[PercentageDate]:
     """Get historical portfolio data as percentage changes."""
+    _check_param("fidelity", fidelity, _FIDELITIES)
+    _check_param("span", span, _SPANS)
+    _check_param("bounds", bounds, _BOUNDS)
+    # The checks above narrow each value to its Literal type
     return get_historical_portfolio_percentage(
-        fidelity=fidelity, span=span, bounds=bounds
+        fidelity=cast(FidelityType, fidelity),
+        span=cast(SpanType, span),
+        bounds=cast(BoundsType, bounds),
     )
 
 
@@ -3,10 +3,13 @@ Module for interacting with Robinhood API, providing portfolio and transaction d
 Handles historical data retrieval and percentage calculations with caching support.
 """
 
+import bisect
 import datetime
 import logging
 import os
+from itertools import islice
 
+import numpy as np
 import robin_stocks.robinhood as rh
 
 from accountability.caching import cache_result
@@ -47,14 +50,16 @@ def _get_historical_portfolio_percentage(
     if len(historicals) == 0:
         return []
 
-    prev_close = historicals[0]["close_equity"]
-    percentages = []
-    for h in historicals:
-        percentages.append((h["close_equity"] - prev_close) / prev_close)
-        prev_close = h["close_equity"]
+    closes = np.fromiter(
+        (h["close_equity"] for h in historicals),
+        dtype=np.float64,
+        count=len(historicals),
+    )
+    percentages = np.zeros_like(closes)
+    percentages[1:] = np.diff(closes) / closes[:-1]
     return [
         PercentageDate(date=h["begins_at"], percentage=p)
-        for h, p in zip(historicals, percentages)
+        for h, p in zip(historicals, percentages.tolist())
     ]
 
 
@@ -82,14 +87,9 @@ def get_historical_portfolio_percentage(
     logger.info(
         f"[get_historical_portfolio_percentage] {fidelity=}, {span=}, {bounds=}"
     )
-    historical = rh.get_historical_portfolio(fidelity, span, bounds)
-    result: HistoricalPortfolio | None = convert_dict_to_typed_dict(
-        historical, HistoricalPortfolio
-    )
-    if not result:
-        return []
-    percentages = _get_historical_portfolio_percentage(result["equity_historicals"])
-    return percentages
+    # Reuse the cached historicals rather than refetching and reconverting
+    historical = get_historical_portfolio(fidelity, span, bounds)
+    return _get_historical_portfolio_percentage(historical)
 
 
 @cache_result(table_name="bank_transfers", ttl_seconds=3600)
@@ -121,44 +121,82 @@ def get_running_ytd_percentage() -> list[PercentageDate]:
     historical: list[EquityHistorical] = get_historical_portfolio(
         fidelity="day", span="year", bounds="regular"
     )
-    transfers = get_bank_transfers()
-
-    # Shift all transfer dates by one day
-    for transfer in transfers:
-        transfer["created_at"] -= datetime.timedelta(days=1)
+    # The shift below doesn't change their order, so sort once up front. This
+    # builds a new list rather than sorting the cached one in place.
+    transfers = sorted(get_bank_transfers(), key=lambda t: t["created_at"])
+    # Transfers are counted as landing one day before they were created
+    shift = datetime.timedelta(days=1)
 
     cur_year = historical[-1]["begins_at"].date().year
     start_equity = historical[0]["open_equity"]
     start_date = datetime.date(cur_year, 1, 1)
 
-    # filter historical to only include days after the start date
-    historical = [h for h in historical if h["begins_at"].date() >= start_date]
-    # filter transfers to only include transfers after the start date
-    transfers = [t for t in transfers if t["created_at"].date() >= start_date]
-
-    # Track total deposits to adjust the base investment amount
-    total_deposits = 0
-    current_transfer_idx = 0
-
-    percentages = [PercentageDate(date=start_date, percentage=0)]
-
-    for day in historical[1:]:
-        # Add any transfers that occurred on this day
-        while (
-            current_transfer_idx < len(transfers)
-            and transfers[current_transfer_idx]["created_at"] < day["begins_at"]
-        ):
-            transfer = transfers[current_transfer_idx]
-            if transfer["direction"] == "deposit" and transfer["state"] == "completed":
-                total_deposits += transfer["amount"]
-            current_transfer_idx += 1
-
-        # Adjust the percentage calculation to account for deposits
-        adjusted_start = start_equity + total_deposits
-        if adjusted_start != 0:  # Prevent division by zero
-            percentage = (day["close_equity"] - adjusted_start) / adjusted_start
-            percentages.append(
-                PercentageDate(date=day["begins_at"], percentage=percentage)
+    # Both series are in date order, so binary search for the first entry on
+    # or after the start date instead of filtering into new lists
+    first_day = bisect.bisect_left(
+        historical, start_date, key=lambda h: h["begins_at"].date()
+    )
+    first_transfer = bisect.bisect_left(
+        transfers, start_date, key=lambda t: (t["created_at"] - shift).date()
+    )
+
+    # Running total of completed deposits after each transfer, with a leading
+    # zero for "no transfers yet"
+    n_transfers = len(transfers) - first_transfer
+    transfer_times = np.fromiter(
+        (
+            (t["created_at"] - shift).timestamp()
+            for t in islice(transfers, first_transfer, None)
+        ),
+        dtype=np.float64,
+        count=n_transfers,
+    )
+    deposits = np.fromiter(
+        (
+            (
+                t["amount"]
+                if t["direction"] == "deposit" and t["state"] == "completed"
+                else 0.0
             )
+            for t in islice(transfers, first_transfer, None)
+        ),
+        dtype=np.float64,
+        count=n_transfers,
+    )
+    total_deposits = np.concatenate(([0.0], np.cumsum(deposits)))
+
+    # The first day of the year is the baseline; percentages start after it
+    n_days = max(len(historical) - first_day - 1, 0)
+    day_times = np.fromiter(
+        (d["begins_at"].timestamp() for d in islice(historical, first_day + 1, None)),
+        dtype=np.float64,
+        count=n_days,
+    )
+    closes = np.fromiter(
+        (d["close_equity"] for d in islice(historical, first_day + 1, None)),
+        dtype=np.float64,
+        count=n_days,
+    )
 
+    # Number of transfers that landed before each day began
+    transfers_before = np.searchsorted(transfer_times, day_times, side="left")
+    # Adjust the base investment amount to account for those deposits
+    adjusted_start = start_equity + total_deposits[transfers_before]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        day_percentages = (closes - adjusted_start) / adjusted_start
+
+    percentages = [
+        PercentageDate(
+            date=datetime.datetime.combine(start_date, datetime.time()), percentage=0
+        )
+    ]
+    percentages.extend(
+        PercentageDate(date=day["begins_at"], percentage=percentage)
+        for day, percentage, base in zip(
+            islice(historical, first_day + 1, None),
+            day_percentages.tolist(),
+            adjusted_start.tolist(),
+        )
+        if base != 0  # Prevent division by zero
+    )
     return percentages
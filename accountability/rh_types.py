@@ -5,11 +5,14 @@ Includes TypedDict definitions for portfolio data, holdings, and bank transfers.
 
 import datetime
 import logging
+import sys
+from dataclasses import dataclass, is_dataclass
 from typing import (
     TypedDict,
     Optional,
     Literal,
     Any,
+    Callable,
     get_type_hints,
     get_args,
     get_origin,
@@ -18,8 +21,14 @@ from typing import (
 logger = logging.getLogger(__name__)
 
 
-class PercentageDate(TypedDict):
-    """Represents a percentage change at a specific date."""
+@dataclass(slots=True)
+class PercentageDate:
+    """
+    Represents a percentage change at a specific date.
+
+    A slotted dataclass rather than a TypedDict, since responses hold one of
+    these per data point and slots keep each instance small.
+    """
 
     date: datetime.datetime
     percentage: float
@@ -94,13 +103,22 @@ SpanType = Literal["day", "week", "month", "3month", "year"]
 BoundsType = Literal["regular", "extended", "trading"]
 
 
+if sys.version_info >= (3, 11):
+    # fromisoformat accepts a trailing "Z" natively from 3.11
+    _parse_datetime = datetime.datetime.fromisoformat
+else:
+
+    def _parse_datetime(value: str) -> datetime.datetime:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
 def _convert_value_to_type(value: Any, target_type: type) -> Any:
     """Helper function to convert a value to a specific type."""
     if value is None:
         return None
 
     if target_type == datetime.datetime and isinstance(value, str):
-        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return _parse_datetime(value)
 
     if target_type == float:
         if isinstance(value, (int, float)):
@@ -116,16 +134,76 @@ def _convert_value_to_type(value: Any, target_type: type) -> Any:
     return value
 
 
+def _make_field_converter(field_type: Any) -> Callable[[Any], Any]:
+    """Build a function converting a raw field value to field_type."""
+    # Handle list types
+    if get_origin(field_type) is list:
+        element_type = get_args(field_type)[0]
+
+        def convert_list(value: Any) -> list:
+            if not isinstance(value, list):
+                return []
+            return [
+                (
+                    convert_dict_to_typed_dict(item, element_type)
+                    if isinstance(item, dict)
+                    else item
+                )
+                for item in value
+            ]
+
+        return convert_list
+
+    # Handle nested TypedDicts
+    if hasattr(field_type, "__annotations__"):
+        return lambda value: convert_dict_to_typed_dict(value, field_type)
+
+    # Handle basic types
+    return lambda value: _convert_value_to_type(value, field_type)
+
+
+def _make_converter(target_type: type) -> Callable[[dict], Any]:
+    """
+    Build a converter specialized to target_type.
+
+    The type hints are inspected once here, so converting each record only
+    runs the per-field conversion functions. Dataclass targets are
+    instantiated from the converted fields; TypedDicts are plain dicts.
+    """
+    field_converters = [
+        (field_name, _make_field_converter(field_type))
+        for field_name, field_type in get_type_hints(target_type).items()
+    ]
+
+    def convert(data: dict) -> dict:
+        result = {}
+        for field_name, convert_field in field_converters:
+            try:
+                result[field_name] = convert_field(data.get(field_name))
+            except Exception as e:
+                logger.error("Error converting field %s: %s", field_name, str(e))
+                result[field_name] = None
+        return result
+
+    if is_dataclass(target_type):
+        return lambda data: target_type(**convert(data))
+    return convert
+
+
+# Converters built by _make_converter, keyed by target type
+_CONVERTERS: dict[type, Callable[[dict], Any]] = {}
+
+
 def convert_dict_to_typed_dict(data: dict | None, target_type: type) -> Any:
     """
-    Convert a dictionary to a TypedDict with proper type conversion.
+    Convert a dictionary to a TypedDict or dataclass with proper type conversion.
 
     Args:
         data: Source dictionary to convert
-        target_type: Target TypedDict class
+        target_type: Target TypedDict or dataclass
 
     Returns:
-        Converted TypedDict instance or None if conversion fails
+        Converted TypedDict or dataclass instance, or None if conversion fails
     """
     if data is None:
         logger.error("Received None data when converting to %s", target_type.__name__)
@@ -140,41 +218,10 @@ def convert_dict_to_typed_dict(data: dict | None, target_type: type) -> Any:
         return None
 
     try:
-        type_hints = get_type_hints(target_type)
-        result = {}
-
-        for field_name, field_type in type_hints.items():
-            try:
-                field_value = data.get(field_name)
-
-                # Handle list types
-                if get_origin(field_type) is list:
-                    element_type = get_args(field_type)[0]
-                    if isinstance(field_value, list):
-                        result[field_name] = [
-                            (
-                                convert_dict_to_typed_dict(item, element_type)
-                                if isinstance(item, dict)
-                                else item
-                            )
-                            for item in field_value
-                        ]
-                    else:
-                        result[field_name] = []
-                # Handle nested TypedDicts
-                elif hasattr(field_type, "__annotations__"):
-                    result[field_name] = convert_dict_to_typed_dict(
-                        field_value, field_type
-                    )
-                # Handle basic types
-                else:
-                    result[field_name] = _convert_value_to_type(field_value, field_type)
-
-            except Exception as e:
-                logger.error("Error converting field %s: %s", field_name, str(e))
-                result[field_name] = None
-
-        return result
+        converter = _CONVERTERS.get(target_type)
+        if converter is None:
+            converter = _CONVERTERS[target_type] = _make_converter(target_type)
+        return converter(data)
 
     except Exception as e:
         logger.error("Error in convert_dict_to_typed_dict: %s", str(e))
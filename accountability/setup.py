@@ -7,6 +7,9 @@ setup(
     install_requires=[
         "fastapi",
         "uvicorn",
+        "numpy",
+        "zstandard",
+        "orjson",
         "robin_stocks",
     ],
 )
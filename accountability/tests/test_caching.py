@@ -1,9 +1,27 @@
+import json
 import pytest
+import sqlite3
 import time
 from unittest.mock import patch, MagicMock
-from caching import cache_result
+import caching
+from caching import (
+    EVICT_INTERVAL,
+    background_writer,
+    cache_result,
+    flush_writes,
+    get_db_path,
+    make_cache_key,
+)
 from datetime import datetime
 
+def rows(table):
+    """Read a cache table straight from its SQLite file as {key: value}."""
+    conn = sqlite3.connect(get_db_path(table))
+    try:
+        return dict(conn.execute(f"SELECT key, value FROM {table}").fetchall())
+    finally:
+        conn.close()
+
 @pytest.fixture
 def setup_database():
     # This could create a temporary test database
@@ -48,4 +66,167 @@ def test_cache_with_datetime():
     # Second call should return cached result
     result2 = test_function()
     assert isinstance(result2["date"], datetime)
-    assert result1["date"] == result2["date"] 
\ No newline at end of file
+    assert result1["date"] == result2["date"] 
+
+def test_cache_key_ignores_kwargs_order():
+    call_count = 0
+
+    @cache_result(table_name="test_kwargs_cache", ttl_seconds=1)
+    def test_function(a, b):
+        nonlocal call_count
+        call_count += 1
+        return a - b
+
+    assert test_function(a=3, b=1) == 2
+    assert test_function(b=1, a=3) == 2
+    assert call_count == 1
+
+def test_cache_key_ignores_how_arguments_are_passed():
+    call_count = 0
+
+    @cache_result(table_name="test_binding_cache", ttl_seconds=60)
+    def test_function(fidelity, span, bounds="regular"):
+        nonlocal call_count
+        call_count += 1
+        return fidelity + span + bounds
+
+    # A fresh argument each run, so rows left by earlier runs can't match
+    fidelity = str(time.time())
+    test_function(fidelity, "year", "regular")
+    test_function(fidelity, span="year")
+    test_function(fidelity=fidelity, span="year", bounds="regular")
+    assert call_count == 1
+
+def test_cache_key_ignores_identity_and_dict_order():
+    name = b"f"
+    a, b = "day", "".join(["da", "y"])
+    assert a == b and a is not b
+    assert make_cache_key(name, (("x", a), ("y", a))) == make_cache_key(
+        name, (("x", a), ("y", b))
+    )
+    assert make_cache_key(name, (("x", {"a": 1, "b": 2}),)) == make_cache_key(
+        name, (("x", {"b": 2, "a": 1}),)
+    )
+
+def test_cache_accepts_unpicklable_arguments():
+    call_count = 0
+
+    @cache_result(table_name="test_unpicklable_cache", ttl_seconds=60)
+    def test_function(callback):
+        nonlocal call_count
+        call_count += 1
+        return callback()
+
+    callback = lambda: 7  # noqa: E731
+    assert test_function(callback) == 7
+    assert test_function(callback) == 7
+    assert call_count == 1
+
+def test_flush_writes_commits_pending_results():
+    @cache_result(table_name="test_flush_cache", ttl_seconds=60)
+    def test_function(x):
+        return x + 1
+
+    # A fresh argument each run, so rows left by earlier runs can't match
+    x = time.time()
+    assert test_function(x) == x + 1
+    flush_writes()
+
+    values = [caching._deserialize(v) for v in rows("test_flush_cache").values()]
+    assert x + 1 in values
+
+def test_pending_writes_flush_without_further_calls():
+    @cache_result(table_name="test_idle_flush_cache", ttl_seconds=60)
+    def test_function(x):
+        return x + 2
+
+    x = time.time()
+    assert test_function(x) == x + 2
+    time.sleep(caching.MAX_PENDING_AGE * 4)
+
+    values = [caching._deserialize(v) for v in rows("test_idle_flush_cache").values()]
+    assert x + 2 in values
+
+@pytest.mark.asyncio
+async def test_background_writer_commits_queued_writes():
+    @cache_result(table_name="test_writer_cache", ttl_seconds=60)
+    def test_function(x):
+        return x * 3
+
+    async with background_writer():
+        assert test_function(2) == 6
+        assert caching._pending == []
+
+    assert len(rows("test_writer_cache")) >= 1
+
+def test_cache_evicts_least_recently_accessed_rows(monkeypatch):
+    # Let every memory hit refresh last_accessed
+    monkeypatch.setattr(caching, "TOUCH_INTERVAL", 0)
+
+    @cache_result(table_name="test_evict_cache", ttl_seconds=60, max_entries=10)
+    def test_function(x):
+        return x
+
+    # Start empty so every call below is an insert
+    with caching.RetryableDatabase(get_db_path("test_evict_cache")) as conn, conn:
+        conn.execute("DELETE FROM test_evict_cache")
+
+    for x in range(EVICT_INTERVAL - 1):
+        test_function(x)
+    # Read the oldest keys again; these are served from memory
+    for x in range(3):
+        test_function(x)
+    # The last insert triggers eviction
+    test_function(EVICT_INTERVAL - 1)
+    flush_writes()
+
+    keys = set(rows("test_evict_cache"))
+    assert len(keys) <= 10
+    name = test_function.__qualname__.encode()
+    for x in range(3):
+        assert make_cache_key(name, (("x", x),)) in keys
+
+def test_cache_round_trips_compressed_values():
+    @cache_result(table_name="test_compressed_cache", ttl_seconds=60, maxsize=0)
+    def test_function(n):
+        return [{"close_equity": float(i), "session": "reg"} for i in range(n)]
+
+    expected = test_function(500)
+    flush_writes()
+    assert test_function(500) == expected
+
+def test_portable_cache_stores_json():
+    @cache_result(
+        table_name="test_portable_cache", ttl_seconds=60, maxsize=0, portable=True
+    )
+    def test_function():
+        return {"date": datetime(2024, 1, 1), "percentage": 0.5}
+
+    test_function()
+    flush_writes()
+
+    # Served from SQLite, so the datetime has round-tripped through JSON
+    assert test_function() == {"date": "2024-01-01T00:00:00+00:00", "percentage": 0.5}
+
+def test_portable_cache_rows_are_plain_json():
+    @cache_result(table_name="test_plain_json_cache", ttl_seconds=60, portable=True)
+    def test_function(n):
+        return [{"i": i} for i in range(n)]
+
+    # Both below and above the size at which pickles get compressed
+    test_function(1)
+    test_function(500)
+    flush_writes()
+
+    stored = sorted(map(json.loads, rows("test_plain_json_cache").values()), key=len)
+    assert stored == [test_function(1), test_function(500)]
+
+def test_portable_cache_returns_same_value_from_every_layer():
+    @cache_result(table_name="test_portable_lru_cache", ttl_seconds=60, portable=True)
+    def test_function():
+        return {"date": datetime(2024, 1, 1)}
+
+    expected = {"date": "2024-01-01T00:00:00+00:00"}
+    # Computed, then served from the in-process LRU
+    assert test_function() == expected
+    assert test_function() == expected
@@ -0,0 +1,119 @@
+import numpy as np
+from datetime import date, datetime, timezone
+from accountability.chart_data import (
+    bucket_by_week,
+    filter_date_range,
+    filter_date_range_np,
+    gap_rangebreaks,
+    parse_iso_dates,
+)
+
+
+def test_parse_iso_dates_keeps_wall_clock_time():
+    raw = [
+        "2024-01-02T14:30:00Z",
+        "2024-01-02T14:30:00+00:00",
+        "2024-01-02T09:30:00-05:00",
+        "2024-01-02T23:30:00+09:00",
+        "2024-01-02",
+    ]
+    expected = np.array(
+        [
+            "2024-01-02T14:30:00",
+            "2024-01-02T14:30:00",
+            "2024-01-02T09:30:00",
+            "2024-01-02T23:30:00",
+            "2024-01-02T00:00:00",
+        ],
+        dtype="datetime64[us]",
+    )
+    np.testing.assert_array_equal(parse_iso_dates(raw), expected)
+
+
+def test_bucket_by_week_starts_weeks_on_monday():
+    dates = np.array(
+        # Sun, Mon, Sat, Sun of one week, then the next Monday
+        ["2024-01-07", "2024-01-08", "2024-01-13", "2024-01-14", "2024-01-15"],
+        dtype="datetime64[us]",
+    )
+    weeks, means = bucket_by_week(dates, [1.0, 2.0, 3.0, 7.0, 5.0])
+    np.testing.assert_array_equal(
+        weeks, np.array(["2024-01-01", "2024-01-08", "2024-01-15"], "datetime64[D]")
+    )
+    np.testing.assert_allclose(means, [1.0, 4.0, 5.0])
+
+
+def test_bucket_by_week_accepts_unsorted_dates():
+    dates = np.array(["2024-01-15", "2024-01-08", "2024-01-09"], "datetime64[us]")
+    weeks, means = bucket_by_week(dates, [5.0, 2.0, 4.0])
+    np.testing.assert_array_equal(
+        weeks, np.array(["2024-01-08", "2024-01-15"], "datetime64[D]")
+    )
+    np.testing.assert_allclose(means, [3.0, 5.0])
+
+
+def test_gap_rangebreaks_hide_the_closed_hours():
+    step = np.timedelta64(3600, "s")
+    dates = np.array(
+        [
+            "2024-01-02T19:00",
+            "2024-01-02T20:00",
+            "2024-01-03T14:00",
+            "2024-01-03T15:00",
+        ],
+        dtype="datetime64[us]",
+    )
+    # From half a step after 20:00 to half a step before 14:00 the next day
+    assert gap_rangebreaks(dates, step) == [
+        dict(values=["2024-01-02T20:30:00.000000"], dvalue=17 * 3600 * 1000)
+    ]
+
+
+def test_gap_rangebreaks_ignore_evenly_spaced_points():
+    step = np.timedelta64(300, "s")
+    dates = np.arange(
+        np.datetime64("2024-01-02T14:00"), np.datetime64("2024-01-02T15:00"), step
+    ).astype("datetime64[us]")
+    assert gap_rangebreaks(dates, step) == []
+
+
+def test_filter_paths_agree():
+    # Hourly points over two weeks, so both weekends and both range ends
+    # fall mid-series
+    dates = np.arange(
+        np.datetime64("2024-01-05T00:00"),
+        np.datetime64("2024-01-19T00:00"),
+        np.timedelta64(1, "h"),
+    ).astype("datetime64[us]")
+    values = np.arange(len(dates), dtype=np.float64)
+    start, end = date(2024, 1, 6), date(2024, 1, 15)
+
+    np_dates, np_values = filter_date_range_np(dates, values, start, end)
+    py_dates, py_values = filter_date_range(dates, values, start, end)
+    assert len(dates) < 1000  # filter_date_range takes the Python path
+    np.testing.assert_array_equal(np.array(py_dates, "datetime64[us]"), np_dates)
+    np.testing.assert_array_equal(py_values, np_values)
+    assert np_dates[0] == np.datetime64("2024-01-08T00:00")
+    assert np_dates[-1] == np.datetime64("2024-01-15T23:00")
+
+    # Timezone-aware datetimes, as the API types hold them
+    aware = [d.replace(tzinfo=timezone.utc) for d in dates.tolist()]
+    aware_dates, aware_values = filter_date_range(aware, values, start, end)
+    assert aware_dates == py_dates and aware_values == py_values
+
+
+def test_filter_paths_agree_on_ytd():
+    year = date.today().year
+    dates = np.arange(
+        np.datetime64(f"{year - 1}-12-25"),
+        np.datetime64(f"{year}-01-20"),
+        np.timedelta64(1, "D"),
+    ).astype("datetime64[us]")
+    values = np.arange(len(dates), dtype=np.float64)
+
+    np_dates, np_values = filter_date_range_np(dates, values)
+    py_dates, py_values = filter_date_range(dates, values)
+    np.testing.assert_array_equal(np.array(py_dates, "datetime64[us]"), np_dates)
+    np.testing.assert_array_equal(py_values, np_values)
+    assert all(d.year == year and d.weekday() < 5 for d in py_dates)
+    assert isinstance(py_dates[0], datetime)
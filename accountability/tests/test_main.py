@@ -28,3 +28,29 @@ def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json() == {"status": "healthy"}
+
+
+def test_portfolio_history_percentage_rejects_unknown_fidelity():
+    with patch("main.get_historical_portfolio_percentage") as mock:
+        response = client.get(
+            "/portfolio/historical/percentage", params={"fidelity": "minute"}
+        )
+    assert response.status_code == 422
+    mock.assert_not_called()
+
+
+def test_portfolio_history_percentage_passes_valid_params():
+    with patch("main.get_historical_portfolio_percentage", return_value=[]) as mock:
+        response = client.get(
+            "/portfolio/historical/percentage",
+            params={"fidelity": "hour", "span": "month"},
+        )
+    assert response.status_code == 200
+    mock.assert_called_once_with(fidelity="hour", span="month", bounds="regular")
+
+
+def test_portfolio_history_percentage_documents_allowed_values():
+    operation = app.openapi()["paths"]["/portfolio/historical/percentage"]["get"]
+    schemas = {p["name"]: p["schema"] for p in operation["parameters"]}
+    assert schemas["fidelity"]["enum"] == ["10minute", "5minute", "day", "hour", "week"]
+    assert schemas["bounds"]["enum"] == ["extended", "regular", "trading"]
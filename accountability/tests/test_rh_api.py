@@ -26,7 +26,7 @@ def sample_historical_data():
 def test_get_historical_portfolio_percentage(sample_historical_data):
     result = _get_historical_portfolio_percentage(sample_historical_data)
     assert len(result) == 2
-    assert result[1]["percentage"] == pytest.approx(0.1)  # 10% increase
+    assert result[1].percentage == pytest.approx(0.1)  # 10% increase
 
 
 @patch("robin_stocks.robinhood.get_historical_portfolio")
@@ -75,3 +75,41 @@ def test_get_bank_transfers(mock_get_transfers):
     result = get_bank_transfers()
     assert len(result) == 1
     assert result[0]["amount"] == 1000.0
+
+
+def test_get_running_ytd_percentage_is_repeatable():
+    historical = [
+        {
+            "open_equity": 1000.0,
+            "close_equity": 1000.0,
+            "begins_at": datetime(2024, 1, 2),
+        },
+        {
+            "open_equity": 1000.0,
+            "close_equity": 1100.0,
+            "begins_at": datetime(2024, 1, 3),
+        },
+        {
+            "open_equity": 1100.0,
+            "close_equity": 1210.0,
+            "begins_at": datetime(2024, 1, 4),
+        },
+    ]
+    transfers = [
+        {
+            "amount": 100.0,
+            "direction": "deposit",
+            "state": "completed",
+            "created_at": datetime(2024, 1, 4),
+        }
+    ]
+
+    # Cached results are shared objects, so repeated calls must not mutate them
+    with patch(
+        "accountability.rh_api.get_historical_portfolio", return_value=historical
+    ), patch("accountability.rh_api.get_bank_transfers", return_value=transfers):
+        first = get_running_ytd_percentage()
+        second = get_running_ytd_percentage()
+
+    assert [p.percentage for p in first] == pytest.approx([0, 0.1, 0.1])
+    assert first == second
@@ -12,8 +12,9 @@ from accountability.rh_types import (
 def test_convert_percentage_date():
     data = {"date": "2024-01-01T00:00:00Z", "percentage": 0.05}
     result = convert_dict_to_typed_dict(data, PercentageDate)
-    assert isinstance(result["date"], datetime)
-    assert result["percentage"] == 0.05
+    assert isinstance(result, PercentageDate)
+    assert isinstance(result.date, datetime)
+    assert result.percentage == 0.05
 
 
 def test_convert_holding():
@@ -1,16 +1,48 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+import numpy as np
 import plotly.graph_objects as go
-from datetime import datetime, date, timedelta
+import plotly.io as pio
+from tsdownsample import LTTBDownsampler, MinMaxDownsampler
 from typing import Dict, Any
-from collections import defaultdict
 import subprocess
 import sys
 import time
 import os
 from multiprocessing import Process
 
+from accountability.chart_data import (
+    INTRADAY_STEPS,
+    bucket_by_week,
+    filter_date_range,
+    gap_rangebreaks,
+    parse_iso_dates,
+)
+
+# Serialize figures with orjson; st.plotly_chart goes through plotly.io.to_json
+pio.json.config.default_engine = "orjson"
+
 BASE_URL = "http://localhost:8000"
+REQUEST_TIMEOUT = 10  # seconds
+
+
+# Process-wide singletons, kept across reruns and sessions by Streamlit
+@st.cache_resource(show_spinner=False)
+def get_session() -> requests.Session:
+    """Return the session that shares keep-alive connections to the API."""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+    return session
+
+
+@st.cache_resource(show_spinner=False)
+def get_executor() -> ThreadPoolExecutor:
+    """Return the thread pool that runs the API fetches."""
+    return ThreadPoolExecutor(max_workers=4)
+
 
 # Configure the page
 st.set_page_config(
@@ -44,26 +76,58 @@ TIME_RANGE_OPTIONS = {
     "1m": {"label": "1M", "span": "month", "fidelity": "day"},
     "ytd": {"label": "YTD", "span": "year", "fidelity": "day"},
 }
-# Initialize session state for selected range if it doesn't exist
+
+# Layout shared by every render of the bar chart; title and x-axis vary
+BAR_LAYOUT_BASE = dict(
+    yaxis=dict(
+        tickformat=".2f",
+        ticksuffix="%",
+        zeroline=True,
+        zerolinecolor="rgba(255,255,255,0.2)",
+        zerolinewidth=1,
+    ),
+    template="plotly_dark",
+    height=600,
+    hovermode="x unified",
+    bargap=0.1,
+    showlegend=False,
+    margin=dict(b=100),  # Add bottom margin for rotated labels
+)
+
+YTD_LAYOUT_BASE = dict(
+    title="Portfolio Performance (YTD)",
+    xaxis=dict(
+        title="Date",
+        tickformat="%Y-%m-%d",
+        tickangle=45,
+    ),
+    yaxis=dict(
+        title="Percentage Change",
+        tickformat=".2f",
+        ticksuffix="%",
+        zeroline=False,
+    ),
+    template="plotly_dark",
+    height=600,
+    hovermode="x unified",
+    showlegend=False,
+    margin=dict(b=100),
+)
+# Initialize session state for selected range if it doesn't exist, restoring
+# it from the URL so a page refresh keeps the chosen range
 if "selected_range" not in st.session_state:
-    st.session_state.selected_range = "1d"
+    range_param = st.query_params.get("range", "1d")
+    st.session_state.selected_range = (
+        range_param if range_param in TIME_RANGE_OPTIONS else "1d"
+    )
+
+
+def _set_range(key):
+    """Button callback; Streamlit reruns the bar chart once it returns."""
+    st.session_state.selected_range = key
+    st.query_params["range"] = key
+
 
-# Move time range selection to sidebar and keep buttons horizontal
-with st.sidebar:
-    st.header("Time Range")
-    cols = st.columns(len(TIME_RANGE_OPTIONS))
-    for col, (key, options) in zip(cols, TIME_RANGE_OPTIONS.items()):
-        if col.button(
-            options["label"],
-            key=f"btn_{key}",
-            type="primary" if st.session_state.selected_range == key else "secondary",
-            on_click=lambda k=key: setattr(st.session_state, "selected_range", k),
-        ):
-            st.rerun()
-
-time_range = st.session_state.selected_range
-fidelity = TIME_RANGE_OPTIONS[time_range]["fidelity"]
-span = TIME_RANGE_OPTIONS[time_range]["span"]
 bounds = "regular"
 
 # Add this function near the top of the file, after imports
@@ -95,123 +159,146 @@ if __name__ == '__main__':
         import atexit
         atexit.register(cleanup)
 
-# Function to fetch data from the FastAPI backend
-@st.cache_data(ttl=300)  # Cache the data for 5 minutes
+# Functions to fetch data from the FastAPI backend. They run on worker
+# threads, so they only raise; the script shows errors when collecting them
+@st.cache_data(ttl=300, show_spinner=False)  # Cache the data for 5 minutes
 def fetch_portfolio_data(params: Dict[str, Any]) -> Dict[str, Any]:
+    response = get_session().get(
+        f"{BASE_URL}/portfolio/historical/percentage",
+        params=params,
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_ytd_data() -> Dict[str, Any]:
+    response = get_session().get(f"{BASE_URL}/portfolio/ytd", timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+
+def collect(future, error_prefix):
+    """Wait for a fetch, showing its error and returning None if it failed."""
     try:
-        with st.spinner("Fetching portfolio data..."):
-            response = requests.get(
-                f"{BASE_URL}/portfolio/historical/percentage", params=params
-            )
-            response.raise_for_status()
-            return response.json()
-    except requests.RequestException as e:
-        st.error(f"Error fetching data: {str(e)}")
+        return future.result()
+    except (requests.RequestException, orjson.JSONDecodeError) as e:
+        st.error(f"{error_prefix}: {str(e)}")
         return None
 
 
-# Update parameters
-params = {"fidelity": fidelity, "bounds": bounds, "span": span}
+# Start the YTD fetch now so it overlaps the portfolio fetch in the bar chart
+ytd_future = get_executor().submit(fetch_ytd_data)
 
-# Fetch the data
-data = fetch_portfolio_data(params)
 
+# A chart is only ~1500px wide, so longer series are downsampled to this
+MAX_PLOTTED_POINTS = 2000
 
-def filter_date_range(dates, values, start_date=None, end_date=None):
-    """Filter data based on date range or YTD, excluding weekends."""
-    if not dates or not values:
-        return [], []
 
-    def is_weekday(d):
-        """Return True if date is a weekday (Mon-Fri)"""
-        return d.weekday() < 5  # Monday = 0, Sunday = 6
+def plot_indices(dates, values, downsampler):
+    """Return the indices of the points to plot, all of them if few enough."""
+    if len(values) <= MAX_PLOTTED_POINTS:
+        return slice(None)
+    return downsampler.downsample(
+        dates.view(np.int64), values, n_out=MAX_PLOTTED_POINTS
+    )
 
-    if start_date and end_date:
-        # Convert dates to timezone-naive datetime for comparison
-        start_dt = datetime.combine(start_date, datetime.min.time())
-        end_dt = datetime.combine(end_date, datetime.max.time())
 
-        # Convert API dates to timezone-naive and filter weekdays
-        filtered_data = [
-            (d.replace(tzinfo=None), v)
-            for d, v in zip(dates, values)
-            if start_dt <= d.replace(tzinfo=None) <= end_dt and is_weekday(d)
-        ]
-    else:
-        # Filter for YTD and weekdays
-        current_year = date.today().year
-        filtered_data = [
-            (d, v)
-            for d, v in zip(dates, values)
-            if d.replace(tzinfo=None).year >= current_year and is_weekday(d)
-        ]
+@st.cache_data(ttl=300)
+def prepare_bar_data(params_key, time_range):
+    """Parse, filter and bucket the bar chart data for a time range.
+
+    Returns None if the fetch failed, otherwise a tuple of
+    (dates, values, colors, start_date, end_date, bucketed) with the values
+    in percent. The arrays are empty if nothing is left after filtering.
+    """
+    params = dict(params_key)
+    data = fetch_portfolio_data(params)
+    if not data:
+        return None
 
-    if not filtered_data:
-        return [], []
+    # Convert datetime strings to datetime64
+    dates = parse_iso_dates([db["date"] for db in data])
+    values = np.fromiter(
+        (db["percentage"] for db in data), dtype=np.float64, count=len(data)
+    )
 
-    return [d for d, _ in filtered_data], [v for _, v in filtered_data]
+    # Filter based on selected date range, then work on contiguous arrays
+    dates, filtered_values = filter_date_range(dates, values)
+    if len(filtered_values) == 0:
+        return [], [], [], None, None, False
+    dates = np.asarray(dates, dtype="datetime64[us]")
+    filtered_values = np.asarray(filtered_values, dtype=np.float64)
+
+    start_date = dates[0].item()
+    end_date = dates[-1].item()
+    # Bucket by week if span is longer than 3 months
+    bucketed = params["span"] in ["year", "5year", "all"] or (
+        time_range != "ytd" and (end_date - start_date).days > 90
+    )
+    if bucketed:
+        dates, filtered_values = bucket_by_week(dates, filtered_values)
 
+    # Convert percentage values (multiply by 100 and round), rounding in place
+    filtered_values = filtered_values * 100
+    np.round(filtered_values, 2, out=filtered_values)
 
-def bucket_by_week(dates, values):
-    """Group data by week and calculate the average for each week."""
-    weekly_data = defaultdict(list)
+    # Create colors array based on values
+    colors = np.where(filtered_values < 0, "#FF4B4B", "#00C805")
 
-    # Group values by week
-    for date, value in zip(dates, values):
-        # Get the start of the week (Monday)
-        week_start = date - timedelta(days=date.weekday())
-        weekly_data[week_start].append(value)
+    # API timestamps are whole seconds; this keeps them short once serialized
+    dates = np.asarray(dates, dtype="datetime64[s]")
+    return dates, filtered_values, colors, start_date, end_date, bucketed
 
-    # Calculate average for each week
-    weekly_dates = sorted(weekly_data.keys())
-    weekly_values = [sum(weekly_data[d]) / len(weekly_data[d]) for d in weekly_dates]
 
-    return weekly_dates, weekly_values
+@st.fragment
+def render_bar_chart():
+    """Draw the range buttons and bar chart; a click reruns only this part."""
+    time_range = st.session_state.selected_range
+    fidelity = TIME_RANGE_OPTIONS[time_range]["fidelity"]
+    span = TIME_RANGE_OPTIONS[time_range]["span"]
 
+    # Update parameters
+    params = {"fidelity": fidelity, "bounds": bounds, "span": span}
+    portfolio_future = get_executor().submit(fetch_portfolio_data, params)
 
-# When displaying the graph, wrap it in an expander
-with st.expander("Bucketed percentage change", expanded=True):
-    if data:
-        # Convert datetime strings to datetime objects
-        dates = [datetime.fromisoformat(db["date"]) for db in data]
-        values = [db["percentage"] for db in data]
-
-        # Filter based on selected date range
-        if time_range == "ytd":
-            dates, filtered_values = filter_date_range(dates, values)
-        else:
-            dates, filtered_values = filter_date_range(
-                dates, values, start_date=None, end_date=None
-            )
+    # Keep the time range buttons horizontal above the chart
+    cols = st.columns(len(TIME_RANGE_OPTIONS))
+    for col, (key, options) in zip(cols, TIME_RANGE_OPTIONS.items()):
+        col.button(
+            options["label"],
+            key=f"btn_{key}",
+            type="primary" if time_range == key else "secondary",
+            on_click=_set_range,
+            args=(key,),
+        )
+
+    with st.spinner("Fetching portfolio data..."):
+        data = collect(portfolio_future, "Error fetching data")
+    # The fetch has filled its cache, so preparing does not request it again
+    prepared = (
+        prepare_bar_data(tuple(sorted(params.items())), time_range) if data else None
+    )
+    if prepared is not None:
+        dates, filtered_values, colors, start_date, end_date, bucketed = prepared
 
         # Check if we have any data after filtering
-        if not filtered_values:
+        if len(filtered_values) == 0:
             st.warning("No data available for the selected time range.")
         else:
-            start_date = dates[0]
-            end_date = dates[-1]
-            # Bucket by week if span is longer than 3 months
-            if span in ["year", "5year", "all"] or (
-                time_range != "ytd" and (end_date - start_date).days > 90
-            ):
-                dates, filtered_values = bucket_by_week(dates, filtered_values)
-
-            # Convert percentage values (multiply by 100 and round)
-            filtered_values = [round(v * 100, 2) for v in filtered_values]
-
-            # Create colors array based on values
-            colors = ["#FF4B4B" if v < 0 else "#00C805" for v in filtered_values]
-
             # Create the plot
             fig = go.Figure()
 
-            # Add the bar plot with filtered data and dynamic colors
+            # Add the bar plot with filtered data and dynamic colors, keeping
+            # each bucket's extremes when there are too many bars to draw
+            shown = plot_indices(dates, filtered_values, MinMaxDownsampler())
             fig.add_trace(
                 go.Bar(
-                    x=dates,
-                    y=filtered_values,
+                    x=dates[shown],
+                    y=filtered_values[shown],
                     name="Portfolio Performance",
-                    marker_color=colors,  # Use the dynamic colors array
+                    marker_color=colors[shown],  # Use the dynamic colors array
                     hovertemplate="%{y:.2f}%<extra></extra>",
                 )
             )
@@ -222,97 +309,85 @@ with st.expander("Bucketed percentage change", expanded=True):
                 if time_range == "ytd"
                 else f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}"
             )
-            bucketing_text = " (Weekly Average)" if len(dates) != len(data) else ""
+            bucketing_text = " (Weekly Average)" if bucketed else ""
 
-            # Determine date format based on fidelity
-            if fidelity in ["5minute", "10minute", "hour"]:
+            # Determine date format and the gaps to hide based on fidelity
+            if fidelity in INTRADAY_STEPS and not bucketed:
                 date_format = "%Y-%m-%d %H:%M"  # Include time for intraday data
+                rangebreaks = gap_rangebreaks(dates, INTRADAY_STEPS[fidelity])
             else:
                 date_format = "%Y-%m-%d"  # Just date for daily/weekly data
+                rangebreaks = [dict(bounds=["sat", "mon"])]  # Hide weekends
 
             # Configure x-axis to remove gaps
             fig.update_layout(
+                **BAR_LAYOUT_BASE,
                 title=f"Portfolio Performance ({title_date}{bucketing_text} - {FIDELITY_OPTIONS[fidelity]} intervals)",
                 xaxis=dict(
-                    type="category",  # Use category type to remove gaps
-                    tickformat="%Y-%m-%d",  # Format the date display
-                    tickmode="array",
-                    ticktext=[
-                        d.strftime(date_format) for d in dates
-                    ],  # Use appropriate date format
-                    tickvals=list(range(len(dates))),  # Use indices as positions
+                    type="date",
+                    tickformat=date_format,  # Use appropriate date format
                     tickangle=45,  # Angle the dates for better readability
+                    rangebreaks=rangebreaks,
                 ),
-                yaxis=dict(
-                    tickformat=".2f",
-                    ticksuffix="%",
-                    zeroline=True,
-                    zerolinecolor="rgba(255,255,255,0.2)",
-                    zerolinewidth=1,
-                ),
-                template="plotly_dark",
-                height=600,
-                hovermode="x unified",
-                bargap=0.1,
-                showlegend=False,
-                margin=dict(b=100),  # Add bottom margin for rotated labels
             )
 
             # Display the plot
             st.plotly_chart(fig, use_container_width=True)
 
             # Display metrics
+            vfirst, vlast = float(filtered_values[0]), float(filtered_values[-1])
+            vmax, vmin = float(filtered_values.max()), float(filtered_values.min())
             col1, col2, col3 = st.columns(3)
             with col1:
                 st.metric(
                     "Current Change",
-                    f"{filtered_values[-1]:.2f}%",
-                    f"{(filtered_values[-1] - filtered_values[0]):.2f}%",
+                    f"{vlast:.2f}%",
+                    f"{(vlast - vfirst):.2f}%",
                 )
 
             with col2:
-                st.metric("Highest Change", f"{max(filtered_values):.2f}%")
+                st.metric("Highest Change", f"{vmax:.2f}%")
 
             with col3:
-                st.metric("Lowest Change", f"{min(filtered_values):.2f}%")
+                st.metric("Lowest Change", f"{vmin:.2f}%")
     else:
         st.error(
             "Unable to fetch portfolio data. Please make sure the API server is running."
         )
 
 
-# Function to fetch YTD data
-@st.cache_data(ttl=300)
-def fetch_ytd_data() -> Dict[str, Any]:
-    try:
-        with st.spinner("Fetching YTD data..."):
-            response = requests.get(f"{BASE_URL}/portfolio/ytd")
-            response.raise_for_status()
-            return response.json()
-    except requests.RequestException as e:
-        st.error(f"Error fetching YTD data: {str(e)}")
-        return None
+# When displaying the graph, wrap it in an expander
+with st.expander("Bucketed percentage change", expanded=True):
+    render_bar_chart()
 
-# Add YTD line plot in a new expander
-with st.expander("YTD Performance", expanded=True):
-    ytd_data = fetch_ytd_data()
+
+@st.fragment
+def render_ytd_chart():
+    """Draw the YTD line chart, which does not depend on the time range."""
+    with st.spinner("Fetching YTD data..."):
+        ytd_data = collect(ytd_future, "Error fetching YTD data")
 
     if ytd_data:
         # Convert data
-        dates = [datetime.fromisoformat(d["date"]) for d in ytd_data]
-        values = [d["percentage"] * 100 for d in ytd_data]  # Convert to percentages
+        dates = parse_iso_dates([d["date"] for d in ytd_data])
+        values = np.fromiter(
+            (d["percentage"] for d in ytd_data), dtype=np.float64, count=len(ytd_data)
+        )
+        values *= 100  # Convert to percentages
+        vlast, vmax, vmin = float(values[-1]), float(values.max()), float(values.min())
 
         # Create the line plot
         fig = go.Figure()
 
-        # Add the line trace
+        # Add the line trace, downsampled with LTTB to keep its shape
+        shown = plot_indices(dates, values, LTTBDownsampler())
         fig.add_trace(
-            go.Scatter(
-                x=dates,
-                y=values,
+            go.Scattergl(
+                x=dates[shown],
+                y=values[shown],
                 mode="lines",
                 name="YTD Performance",
-                line=dict(color="#00C805" if values[-1] >= 0 else "#FF4B4B", width=2),
+                line=dict(color="#00C805" if vlast >= 0 else "#FF4B4B", width=2),
                 hovertemplate="%{y:.2f}%<extra></extra>",
             )
         )
@@ -323,25 +398,7 @@ with st.expander("YTD Performance", expanded=True):
         )
 
         # Configure layout
-        fig.update_layout(
-            title="Portfolio Performance (YTD)",
-            xaxis=dict(
-                title="Date",
-                tickformat="%Y-%m-%d",
-                tickangle=45,
-            ),
-            yaxis=dict(
-                title="Percentage Change",
-                tickformat=".2f",
-                ticksuffix="%",
-                zeroline=False,
-            ),
-            template="plotly_dark",
-            height=600,
-            hovermode="x unified",
-            showlegend=False,
-            margin=dict(b=100),
-        )
+        fig.update_layout(**YTD_LAYOUT_BASE)
 
         # Display the plot
         st.plotly_chart(fig, use_container_width=True)
@@ -349,18 +406,23 @@ with st.expander("YTD Performance", expanded=True):
         # Display YTD metrics
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("YTD Change", f"{values[-1]:.2f}%")
+            st.metric("YTD Change", f"{vlast:.2f}%")
 
         with col2:
-            st.metric("YTD High", f"{max(values):.2f}%")
+            st.metric("YTD High", f"{vmax:.2f}%")
 
         with col3:
-            st.metric("YTD Low", f"{min(values):.2f}%")
+            st.metric("YTD Low", f"{vmin:.2f}%")
     else:
         st.error(
             "Unable to fetch YTD data. Please make sure the API server is running."
         )
 
+
+# Add YTD line plot in a new expander
+with st.expander("YTD Performance", expanded=True):
+    render_ytd_chart()
+
 # Add footer
 st.markdown("---")
 st.markdown("*Data provided by Robinhood API*")